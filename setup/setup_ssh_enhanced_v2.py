@@ -7,6 +7,7 @@ Cross-platform (Linux/macOS/Windows): Uses stdlib (json, subprocess, pathlib, we
 rich for colors/spinner/TUI (auto-installs if missing), optional platform clipboard via subprocess.
 Requires: Python 3.6+, OpenSSH (install via package manager/Settings).
 Auto-installs rich. Run: python setup_ssh_enhanced_v2.py [accounts]
+Key rotation: python setup_ssh_enhanced_v2.py rotate [accounts | --all]
 """
 
 import argparse
@@ -17,7 +18,9 @@ import re
 import shutil
 import subprocess
 import sys
+import tempfile
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from pathlib import Path
 import webbrowser
@@ -93,6 +96,9 @@ ACCOUNTS_JSON = GITHUB_DIR / "accounts.json"
 DEFAULTS_JSON = GITHUB_DIR / "account_defaults.json"
 MAIN_CONFIG = SSH_DIR / "config"
 
+# Upper bound on concurrent ssh-keygen/ssh processes during rotation
+MAX_PARALLEL = 128
+
 def print_colored(text, color="white"):
     if RICH_AVAILABLE:
         console.print(text, style=color)
@@ -142,15 +148,15 @@ def copy_to_clipboard(content):
     sys_name = platform.system()
     try:
         if sys_name == "Darwin":  # macOS
-            run_command(["pbcopy"], input=content, check=True, capture_output=False)
+            subprocess.run(["pbcopy"], input=content, text=True, check=True)
         elif sys_name == "Windows":
-            run_command(["clip"], input=content, check=True, capture_output=False, shell=True)
+            subprocess.run("clip", input=content, text=True, check=True, shell=True)
         elif sys_name == "Linux":
             # Assume xclip or wl-clipboard; fallback to print
             try:
-                run_command(["xclip", "-selection", "clipboard"], input=content, check=True, capture_output=False)
-            except:
-                run_command(["wl-copy"], input=content, check=True, capture_output=False)
+                subprocess.run(["xclip", "-selection", "clipboard"], input=content, text=True, check=True)
+            except (OSError, subprocess.CalledProcessError):
+                subprocess.run(["wl-copy"], input=content, text=True, check=True)
         else:
             raise NotImplementedError
         return True
@@ -201,7 +207,450 @@ def check_ssh_available():
     except:
         return False
 
+def generate_rotation_key(key_private, email):
+    """Generate a new ED25519 key pair at key_private (worker-safe, never exits)."""
+    cmd = ["ssh-keygen", "-q", "-t", "ed25519", "-f", str(key_private), "-N", "", "-C", email]
+    try:
+        # Never let a worker read the shared tty (e.g. an "Overwrite (y/n)?" prompt)
+        result = subprocess.run(cmd, stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=30)
+    except (subprocess.TimeoutExpired, FileNotFoundError) as e:
+        return False, str(e)
+    return result.returncode == 0, result.stderr.strip()
+
+SSH_HOST_OPTIONS = {
+    "hostname": "HostName",
+    "port": "Port",
+    "proxycommand": "ProxyCommand",
+    "proxyjump": "ProxyJump",
+    "userknownhostsfile": "UserKnownHostsFile",
+    "hostkeyalias": "HostKeyAlias",
+    "stricthostkeychecking": "StrictHostKeyChecking",
+}
+
+def ssh_host_options(account_clean):
+    """Connection and host key settings that ssh resolves for github-<account_clean>."""
+    options = {"hostname": "github.com", "port": "22"}
+    try:
+        result = subprocess.run(["ssh", "-G", f"github-{account_clean}"], capture_output=True, text=True, timeout=10)
+    except (subprocess.TimeoutExpired, FileNotFoundError):
+        result = None
+    if result is not None and result.returncode == 0:
+        for line in result.stdout.splitlines():
+            key, _, value = line.partition(" ")
+            if key in SSH_HOST_OPTIONS and value and value != "none":
+                options[key] = value
+    # No Host block for the alias: ssh echoes the alias back as the hostname
+    if options["hostname"] == f"github-{account_clean}":
+        options["hostname"] = "github.com"
+    args = []
+    for key, value in options.items():
+        args += ["-o", f"{SSH_HOST_OPTIONS[key]}={value}"]
+    return args
+
+def github_user(key_private, host_options, timeout=30):
+    """Return the GitHub login key_private authenticates as, or None.
+
+    Only key_private is offered (IdentitiesOnly, -F none); the alias's host,
+    port, proxy and host key settings are passed back in through host_options.
+    """
+    cmd = [
+        "ssh", "-T", "-F", "none",
+        "-o", "IdentitiesOnly=yes",
+        "-o", "BatchMode=yes",
+        "-o", f"ConnectTimeout={timeout}",
+        *host_options,
+        "-i", str(key_private),
+        "-l", "git",
+        "github.com",
+    ]
+    try:
+        # ssh -T exits 1 even on success; GitHub prints the greeting on stderr.
+        # Leave headroom over ConnectTimeout for the handshake itself.
+        result = subprocess.run(cmd, stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=timeout + 30)
+    except (subprocess.TimeoutExpired, FileNotFoundError):
+        return None
+    match = re.search(r"Hi ([^!\s]+)! You've successfully authenticated", result.stdout + result.stderr)
+    return match.group(1) if match else None
+
+def run_parallel(func, items, message):
+    """Run func(item) for every item concurrently and return {item: result} in input order."""
+    results = {}
+    if not items:
+        return results
+    with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL, len(items))) as pool:
+        futures = {pool.submit(func, item): item for item in items}
+        if RICH_AVAILABLE:
+            with Progress(
+                SpinnerColumn(),
+                TextColumn(f"[cyan]{message}[/cyan] {{task.completed}}/{{task.total}}"),
+                console=console,
+                transient=True,
+            ) as progress:
+                task = progress.add_task("", total=len(futures))
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+                    progress.advance(task)
+        else:
+            print_colored(f"{EMOJIS['mag']} {message}", "cyan")
+            for future in as_completed(futures):
+                results[futures[future]] = future.result()
+    return {item: results[item] for item in items}
+
+HOST_LINE = re.compile(r"^\s*(Host|Match)(?:\s*=\s*|\s+)(.*)$", re.IGNORECASE)
+IDENTITY_LINE = re.compile(r"^(\s*)IdentityFile(?:\s*=\s*|\s+)(.*?)\s*$", re.IGNORECASE)
+
+def find_host_block(lines, account_clean):
+    """Return (start, end) line indices of the Host block naming github-<account_clean>, or None.
+
+    The block runs to the next Host/Match line regardless of indentation.
+    """
+    alias = f"github-{account_clean}"
+    start = None
+    for i, line in enumerate(lines):
+        match = HOST_LINE.match(line)
+        if not match:
+            continue
+        if start is not None:
+            return start, i
+        if match.group(1).lower() == "host" and alias in match.group(2).split():
+            start = i
+    return (start, len(lines)) if start is not None else None
+
+def replace_identity_file(content, account_clean, key_private):
+    """Point the IdentityFile of Host github-<account_clean> at key_private.
+
+    Returns None when no Host line names the alias, so the caller can leave
+    that account on its old key instead of guessing.
+    """
+    lines = content.splitlines(keepends=True)
+    block = find_host_block(lines, account_clean)
+    if block is None:
+        return None
+    start, end = block
+    for i in range(start + 1, end):
+        match = IDENTITY_LINE.match(lines[i])
+        if match:
+            newline = "\n" if lines[i].endswith("\n") else ""
+            lines[i] = f"{match.group(1)}IdentityFile {key_private}{newline}"
+            return "".join(lines)
+    # No IdentityFile yet: add one after the block's last directive
+    last = start
+    for i in range(start + 1, end):
+        if lines[i].strip():
+            last = i
+    if not lines[last].endswith("\n"):
+        lines[last] += "\n"
+    lines.insert(last + 1, f"  IdentityFile {key_private}\n")
+    return "".join(lines)
+
+def config_identity_files(content):
+    """Resolved paths of every IdentityFile referenced in an ssh config."""
+    paths = set()
+    for line in content.splitlines():
+        match = IDENTITY_LINE.match(line)
+        if match:
+            value = match.group(2).strip().strip('"')
+            paths.add(Path(os.path.expanduser(value)).resolve())
+    return paths
+
+def write_staged(path, content):
+    """Write content to a temp file beside path and return it, ready for os.replace."""
+    fd, tmp_name = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    if path.exists():
+        shutil.copymode(path, tmp_name)
+    return Path(tmp_name)
+
+def commit_rotation(rotated):
+    """Switch IdentityFile entries and the registry to the new keys as one unit.
+
+    The new config, new registry and a backup of the current config are all
+    staged before anything is swapped in. If replacing accounts.json fails or
+    is interrupted, the config is restored from the backup, so the two files
+    never disagree. Symlinked files are written through to their targets.
+    Returns the subset of rotated that was actually switched.
+    """
+    config_path = CONFIG.resolve()
+    accounts_path = ACCOUNTS_JSON.resolve()
+    with open(config_path, "r", encoding="utf-8") as f:
+        original_config = f.read()
+    config_content = original_config
+    accounts = get_accounts_json()
+    today = datetime.now().strftime("%Y-%m-%d")
+    committed = {}
+    for entry in accounts:
+        new_key = rotated.get(entry.get("account"))
+        if new_key is None:
+            continue
+        account_clean = re.sub(r"[^a-zA-Z0-9_]", "_", entry["account"])
+        updated = replace_identity_file(config_content, account_clean, new_key)
+        if updated is None:
+            print_colored(f"{EMOJIS['warn']} No 'Host github-{account_clean}' entry in {CONFIG}; keeping old key for {entry['account']}", "yellow")
+            continue
+        config_content = updated
+        committed[entry["account"]] = new_key
+        entry["private_key"] = str(new_key)
+        entry["public_key"] = str(new_key.with_suffix(".pub"))
+        entry["rotated_at"] = today
+
+    staged = []
+    try:
+        staged_backup = write_staged(config_path, original_config)
+        staged.append(staged_backup)
+        staged_config = write_staged(config_path, config_content)
+        staged.append(staged_config)
+        staged_accounts = write_staged(accounts_path, json.dumps(accounts, indent=2))
+        staged.append(staged_accounts)
+
+        os.replace(staged_config, config_path)
+        try:
+            os.replace(staged_accounts, accounts_path)
+        except BaseException:
+            os.replace(staged_backup, config_path)
+            raise
+    finally:
+        for tmp in staged:
+            tmp.unlink(missing_ok=True)
+    return committed
+
+def retire_old_key(key_private, key_public):
+    """Delete an old key pair unless it lives outside GITHUB_DIR or is still referenced."""
+    key_private = Path(key_private).resolve()
+    paths = [key_private] + ([Path(key_public).resolve()] if key_public else [])
+    try:
+        key_private.relative_to(GITHUB_DIR.resolve())
+    except ValueError:
+        return f"{key_private} is outside {GITHUB_DIR}"
+    for entry in get_accounts_json():
+        for key_field in ("private_key", "public_key"):
+            if entry.get(key_field) and Path(entry[key_field]).resolve() in paths:
+                return f"{key_private} is still registered to {entry.get('account')}"
+    with open(CONFIG, "r", encoding="utf-8") as f:
+        in_use = config_identity_files(f.read())
+    if any(path in in_use for path in paths):
+        return f"{key_private} is still an IdentityFile in {CONFIG}"
+    for path in paths:
+        path.unlink(missing_ok=True)
+    return None
+
+def rotate_accounts(names):
+    """Rotate keys for the named accounts; return {account: new private key} that were switched.
+
+    Old keys stay active until the new key verifies as the same GitHub user;
+    accounts that never verify keep their old key and the new one is discarded.
+    """
+    targets = {}
+    for name in names:
+        entry = account_exists(name)
+        if not entry:
+            print_colored(f"{EMOJIS['warn']} Account '{name}' is not registered, skipping", "yellow")
+            continue
+        targets[name] = entry
+
+    # Catch accounts that cannot be cut over before any key is generated
+    with open(CONFIG, "r", encoding="utf-8") as f:
+        config_lines = f.read().splitlines(keepends=True)
+    cleaned = {}
+    for name in targets:
+        cleaned.setdefault(re.sub(r"[^a-zA-Z0-9_]", "_", name), []).append(name)
+    for account_clean, clashing in cleaned.items():
+        if len(clashing) > 1:
+            print_colored(f"{EMOJIS['warn']} {', '.join(clashing)} all map to github-{account_clean}; rotate them separately, skipping", "yellow")
+        elif find_host_block(config_lines, account_clean) is None:
+            print_colored(f"{EMOJIS['warn']} No 'Host github-{account_clean}' entry in {CONFIG}; run setup for '{clashing[0]}' first, skipping", "yellow")
+        else:
+            continue
+        for name in clashing:
+            targets.pop(name)
+
+    if not targets:
+        print_colored(f"{EMOJIS['error']} Nothing to rotate", "red")
+        return {}
+
+    print_colored(f"{EMOJIS['rocket']} Rotating SSH keys for {len(targets)} account(s)", "cyan")
+
+    host_options = {
+        name: ssh_host_options(re.sub(r"[^a-zA-Z0-9_]", "_", name)) for name in targets
+    }
+
+    # Pin the GitHub identity each alias uses today so a key pasted into the
+    # wrong account cannot be cut over
+    def current_user(name):
+        old_key = targets[name].get("private_key")
+        if not old_key or not Path(old_key).exists():
+            return None
+        return github_user(old_key, host_options[name])
+
+    expected_users = run_parallel(current_user, list(targets), "Checking current keys...")
+    for name in list(targets):
+        if expected_users[name]:
+            print_colored(f"{name}: authenticates as {expected_users[name]}", "white")
+            continue
+        print_colored(f"{EMOJIS['warn']} Current key for '{name}' does not authenticate with GitHub", "yellow")
+        user = Prompt.ask(f"GitHub username for '{name}' (blank to skip)", default="") if RICH_AVAILABLE else input(f"GitHub username for '{name}' (blank to skip): ")
+        if user.strip():
+            expected_users[name] = user.strip()
+        else:
+            print_colored(f"Skipping {name}", "yellow")
+            targets.pop(name)
+    if not targets:
+        return {}
+
+    # Generate new keys next to the old ones; old keys stay active until cutover
+    stamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    new_keys = {}
+    for name in targets:
+        account_clean = re.sub(r"[^a-zA-Z0-9_]", "_", name)
+        new_keys[name] = GITHUB_DIR / f"github_{account_clean}_{stamp}"
+
+    rotated = {}
+    committed = False
+    try:
+        generated = run_parallel(
+            lambda name: generate_rotation_key(new_keys[name], targets[name].get("email", "")),
+            list(targets),
+            "Generating keys...",
+        )
+        pending = {}
+        for name, (ok, error) in generated.items():
+            if ok:
+                pending[name] = new_keys[name]
+            else:
+                print_emoji(f"Key generation failed for {name}: {error}", "error", "red")
+        if not pending:
+            return {}
+
+        # One block per account so each key can be pasted on its own
+        print_colored(f"{EMOJIS['key']} New public keys (add each to its own GitHub account):", "yellow")
+        for name, key in pending.items():
+            key_public = key.with_suffix(".pub")
+            print_colored(f"{EMOJIS['github']} {name} → GitHub user {expected_users[name]} ({key_public})", "cyan")
+            print_colored("="*50, "yellow")
+            with open(key_public, "r", encoding="utf-8") as f:
+                print(f.read().strip())
+            print_colored("="*50, "yellow")
+        if len(pending) == 1:
+            key_public = next(iter(pending.values())).with_suffix(".pub")
+            with open(key_public, "r", encoding="utf-8") as f:
+                content = f.read()
+            if copy_to_clipboard(content):
+                print_emoji("Key copied to clipboard automatically!", "check", "green")
+            else:
+                print_colored(f"{EMOJIS['warn']} Could not auto-copy. Manual copy from: {key_public}", "yellow")
+        print_colored("Old keys stay active until the new ones verify; do not remove them from GitHub yet.", "cyan")
+
+        while pending:
+            if RICH_AVAILABLE:
+                Prompt.ask(f"{EMOJIS['clock']} Press Enter AFTER uploading the new keys to GitHub")
+            else:
+                input(f"{EMOJIS['clock']} Press Enter AFTER uploading the new keys to GitHub: ")
+
+            verified = run_parallel(
+                lambda name: github_user(pending[name], host_options[name]),
+                list(pending),
+                "Verifying new keys...",
+            )
+            for name, user in verified.items():
+                # GitHub logins are case-insensitive; typed names may differ in case
+                if user and user.casefold() == expected_users[name].casefold():
+                    rotated[name] = pending.pop(name)
+                    print_emoji(f"New key verified for {name} ({user})", "check", "green")
+                elif user:
+                    print_emoji(f"New key for {name} authenticates as {user}, expected {expected_users[name]}", "error", "red")
+                    print_colored(f"  Remove it from {user}'s GitHub settings and add it to {expected_users[name]}", "yellow")
+                else:
+                    print_emoji(f"New key not accepted yet for {name}", "error", "red")
+
+            if pending:
+                retry = Confirm.ask("Retry verification for failed accounts?") if RICH_AVAILABLE else input("Retry verification for failed accounts? (y/n) [n]: ").lower() == "y"
+                if not retry:
+                    break
+
+        for name in pending:
+            print_colored(f"{EMOJIS['warn']} Kept existing key for {name}; remove the unused new key from GitHub", "yellow")
+
+        if not rotated:
+            print_colored(f"{EMOJIS['error']} No accounts rotated", "red")
+            return {}
+
+        switched = commit_rotation(rotated)
+        committed = True
+        rotated = switched
+    finally:
+        # Discard new keys that were not switched in, including on Ctrl-C/EOF
+        for name, key in new_keys.items():
+            if committed and name in rotated:
+                continue
+            key.unlink(missing_ok=True)
+            key.with_suffix(".pub").unlink(missing_ok=True)
+
+    if not rotated:
+        return {}
+    print_emoji(f"Switched {len(rotated)} account(s) to their new keys", "check", "green")
+
+    # Retire old keys only after the cutover is on disk
+    retired = 0
+    for name in rotated:
+        old_key = targets[name].get("private_key")
+        if not old_key:
+            continue
+        kept = retire_old_key(old_key, targets[name].get("public_key"))
+        if kept:
+            print_colored(f"{EMOJIS['warn']} Kept old key for {name}: {kept}", "yellow")
+        else:
+            retired += 1
+    print_emoji(f"Retired {retired} old key(s) locally", "lock", "green")
+    print_colored("Remove the old keys from GitHub → Settings → SSH and GPG keys to finish rotation.", "white")
+    return rotated
+
+def rotate_main(argv):
+    """Rotate keys for selected accounts: generate, upload, verify, cut over, retire."""
+    parser = argparse.ArgumentParser(
+        prog="setup_ssh_enhanced_v2.py rotate",
+        description="Rotate SSH keys with overlapping old/new keys and atomic cutover",
+    )
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument("accounts", nargs="?", help="Comma-separated account aliases")
+    selection.add_argument("--all", action="store_true", help="Rotate every registered account")
+    args = parser.parse_args(argv)
+
+    if not check_ssh_available():
+        print_colored(f"{EMOJIS['error']} OpenSSH not found. Install via package manager (apt/brew/choco) or Windows Settings.", "red")
+        sys.exit(1)
+
+    registry = get_accounts_json()
+    if not registry:
+        print_colored(f"{EMOJIS['error']} No registered accounts. Run setup first.", "red")
+        sys.exit(1)
+    if not CONFIG.exists():
+        CONFIG.touch()
+
+    try:
+        if args.all:
+            names = [a["account"] for a in registry]
+        else:
+            if args.accounts:
+                accounts_input = args.accounts
+            else:
+                accounts_input = Prompt.ask("Enter account aliases to rotate (comma-separated)") if RICH_AVAILABLE else input("Enter account aliases to rotate (comma-separated): ")
+            names = [a.strip() for a in accounts_input.split(",") if a.strip()]
+        rotated = rotate_accounts(names)
+    except (KeyboardInterrupt, EOFError):
+        print_colored(f"\n{EMOJIS['error']} Rotation aborted; existing keys unchanged", "red")
+        sys.exit(1)
+
+    if not rotated:
+        sys.exit(1)
+    print_emoji("Rotation complete!", "party", "green")
+
 def main():
+    if len(sys.argv) > 1 and sys.argv[1] == "rotate":
+        rotate_main(sys.argv[2:])
+        return
+
     parser = argparse.ArgumentParser(description="Enhanced GitHub SSH Setup v2.0 (Cross-Platform)")
     parser.add_argument("accounts", nargs="?", help="Comma-separated account aliases")
     args = parser.parse_args()
@@ -254,10 +703,11 @@ def main():
             print_colored(f"{EMOJIS['warn']} Account '{account}' already registered!", "yellow")
             choice = Prompt.ask("Overwrite/Skip/Abort", choices=["o", "s", "a"], default="s") if RICH_AVAILABLE else input("Overwrite/Skip/Abort (o/s/a) [s]: ").lower() or "s"
             if choice == "o":
-                remove_account_from_json(account)
-                key_private.unlink(missing_ok=True)
-                key_public.unlink(missing_ok=True)
-                print_colored("Removing existing registration...", "white")
+                # Overwrite goes through rotation so the old key keeps working
+                # until its replacement is uploaded and verified
+                print_colored("Replacing key; the existing key stays active until the new one verifies...", "white")
+                rotate_accounts([account])
+                continue
             elif choice == "a":
                 print_colored("Aborted by user", "red")
                 sys.exit(1)
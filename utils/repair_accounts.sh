@@ -19,6 +19,8 @@ first=true
 find "$GITHUB_DIR" -name 'github_*' ! -name '*.pub' | while read -r key; do
     account=$(basename "$key")
     account=${account#github_}
+    # Rotated keys carry a _YYYYMMDDHHMMSS suffix after the account name
+    account=$(echo "$account" | sed -E 's/_[0-9]{14}$//')
     pub_key="${key}.pub"
     
     # Extract email from public key comment